@@ -4,258 +4,367 @@ import ipaddress
 import argparse
 import configparser
 import os
+import socket
+import struct
+import tempfile
 import csv
+import io
+import sys
+import heapq
+import functools
+import operator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Fields read from every datacenter block, blocks missing a key are filled in from the None template
+block_keys = ('range', 'vpn', 'gre', 'hostname', 'latitude', 'longitude')
+block_template = dict.fromkeys(block_keys)
+block_fields = operator.itemgetter(*block_keys)
+
+zscaler_clouds = ['zscaler.net', 'zscalerone.net', 'zscalertwo.net', 'zscalerthree.net', 'zscloud.net', 'zscalerbeta.net', 'zscalergov.net', 'zscalerten.net']
+
+# Local copy of each cloud's JSON, revalidated against config.zscaler.com on every run
+cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'zscalerdc')
+
+# Shared HTTP session so repeated pulls reuse the connection
+session = requests.Session()
+session.headers.update({'Accept-Encoding': 'gzip', 'Accept': 'application/json'})
 
 # Defining Functions 
-def ip_range(input):
-    first_usable = input.get('first usable')
-    last_usable = input.get('last usable')
+@dataclass
+class FlatBlocks:
+    clouds: list = field(default_factory=list)
+    regions: list = field(default_factory=list)
+    cities: list = field(default_factory=list)
+    cidrs: list = field(default_factory=list)
+    vpns: list = field(default_factory=list)
+    gres: list = field(default_factory=list)
+    hostnames: list = field(default_factory=list)
+    latitudes: list = field(default_factory=list)
+    longitudes: list = field(default_factory=list)
+    first_ips: list = field(default_factory=list)
+    last_ips: list = field(default_factory=list)
+    wildcards: list = field(default_factory=list)
+    datacenters: list = field(default_factory=list)
+def ip_range(first_usable, last_usable):
     usable_range = str(first_usable) + ' - ' + str(last_usable)
     return usable_range
 def print_values(requested):
-    w = 0
-    requested.sort()
-    while w < len(requested):
-        if 'None' not in requested[w]:
-            print(requested[w])
-        w = w + 1
+    sys.stdout.write(''.join(value + '\n' for value in requested))
+def merge_unique(sorted_chunks):
+    previous = None
+    for value in heapq.merge(*sorted_chunks):
+        if value != previous:
+            yield value
+            previous = value
+def int_to_ip(address):
+    return socket.inet_ntoa(struct.pack('!I', address))
+def int_to_ipv6(address):
+    # inet_ntop writes addresses in ::/80 with dotted IPv4 notation, ipaddress keeps them in plain hex
+    if address >> 48:
+        return socket.inet_ntop(socket.AF_INET6, address.to_bytes(16, 'big'))
+    return str(ipaddress.IPv6Address(address))
+def ipv4_usable(ip, prefix):
+    host_mask = (1 << (32 - int(prefix))) - 1
+    network = struct.unpack('!I', socket.inet_pton(socket.AF_INET, ip))[0] & ~host_mask
+    if host_mask <= 1:
+        # A /32 is a single host and both addresses of a /31 are usable (RFC 3021), there is no network or broadcast address to drop
+        return network, network | host_mask
+    return network + 1, (network | host_mask) - 1
+@functools.lru_cache(maxsize=None)
+def usable_range(cidr):
+    ip, prefix = cidr.split('/')
+    if ':' in ip:
+        host_mask = (1 << (128 - int(prefix))) - 1
+        network = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), 'big') & ~host_mask
+        if host_mask <= 1:
+            return int_to_ipv6(network), int_to_ipv6(network | host_mask)
+        return int_to_ipv6(network + 1), int_to_ipv6((network | host_mask) - 1)
+    first, last = ipv4_usable(ip, prefix)
+    return int_to_ip(first), int_to_ip(last)
+@functools.lru_cache(maxsize=None)
+def cidr_wildcards(cidr):
+    ip, prefix = cidr.split('/')
+    if ':' in ip:
+        return None
+    first, last = ipv4_usable(ip, prefix)
+    wildcard_prefix = str(first >> 24) + '.' + str((first >> 16) & 255) + '.'
+    return tuple(wildcard_prefix + str(third_octet) + '.*' for third_octet in range((first >> 8) & 255, ((last >> 8) & 255) + 1))
+def csv_rows(blocks):
+    wildcard_all = ('-'.join(wildcard or ()) for wildcard in blocks.wildcards)
+    yield from zip(blocks.clouds, blocks.regions, blocks.cities, blocks.cidrs, blocks.vpns, blocks.gres, blocks.hostnames, blocks.latitudes, blocks.longitudes, blocks.first_ips, blocks.last_ips, wildcard_all)
+def parse_json(body):
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+def read_cache(cache_path):
+    with open(cache_path, 'rb') as cache_file:
+        return parse_json(cache_file.read())
+def write_cache(path, body):
+    # Written to a unique temp file and moved into place so concurrent runs never interleave their writes
+    temp_file = tempfile.NamedTemporaryFile(dir = os.path.dirname(path), suffix = '.tmp', delete = False)
+    try:
+        with temp_file:
+            temp_file.write(body)
+        os.replace(temp_file.name, path)
+    finally:
+        if os.path.exists(temp_file.name):
+            os.remove(temp_file.name)
+def fetch_json(url, cache_path, revalidate = True):
+    # The cache is best-effort, the pull still works when it cannot be read or written
+    validators_path = cache_path + '.meta'
+    cached = revalidate and os.path.exists(cache_path) and os.path.exists(validators_path)
+    headers = {}
+    if cached:
+        try:
+            with open(validators_path) as validators_file:
+                headers = json.load(validators_file)
+        except (OSError, ValueError):
+            cached, headers = False, {}
+    try:
+        with session.get(url, headers = headers, timeout = 30) as response:
+            if response.status_code == 304:
+                try:
+                    return read_cache(cache_path)
+                except (OSError, ValueError):
+                    # Unreadable or corrupt cached copy, pull the full body again without the validators
+                    return fetch_json(url, cache_path, revalidate = False)
+            response.raise_for_status()
+            body = response.content
+            validators = {}
+            if 'ETag' in response.headers:
+                validators['If-None-Match'] = response.headers['ETag']
+            if 'Last-Modified' in response.headers:
+                validators['If-Modified-Since'] = response.headers['Last-Modified']
+    except requests.RequestException:
+        if cached:
+            return read_cache(cache_path)
+        raise
+    # Only a body that parses replaces the cached copy, so a proxy page or truncated download keeps the last good one
+    try:
+        data = parse_json(body)
+    except ValueError:
+        if cached:
+            return read_cache(cache_path)
+        raise
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok = True)
+        if os.path.exists(validators_path):
+            os.remove(validators_path)
+        write_cache(cache_path, body)
+        write_cache(validators_path, json.dumps(validators).encode())
+    except OSError:
+        pass
+    return data
+def fetch_cloud(cloud):
+    return fetch_json('https://config.zscaler.com/api/' + cloud + '/cenr/json', os.path.join(cache_dir, cloud + '.json'))
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        prog = "ZScaler Datacenter Config Extract Tool",
+        description = "This script pulls the configuration for the specified ZScaler datacenters. Configuration can be done in the command-line or provided by a config file named 'config.toml' or 'config.ini'.",
+        epilog = "Although there are many safeguards to stop from the use of bad configs or errors not all situations can be caught. If no output is provided check the configuration and verify its accuracy."
+    )
+    parser.add_argument('-nocfg', '-noconfig', dest = 'no_config', action = 'store_true', help = 'Specifies if the present config file should be ignored if one is present.')
+    parser.add_argument('-c', '-cloud', dest = 'cloud', type = str, help = 'Specifies ZScaler cloud that the data will be pulled for ex. "zscaler.net"')
+    parser.add_argument('-r', '-regions', dest = 'regions', type = str, help = 'Specifies ZScaler regions, for the specified cloud, that will be used for the data pull. for ex."Americas,EMEA" ')
+    parser.add_argument('-d', '-datacenters', dest = 'datacenters', type = str, help = 'Specifies ZScaler datacenters for the specified cloud, that will be used for the data pull. ex. "Atlanta II,Atlanta III, Boston I"')
+    parser.add_argument('-i', '-ipformat', dest = 'ipformat', type = str.lower, help = 'Specifies the type of information pulled ex. "range", "cidr", "wildcard" or "all". As a note "all" will print all information into a csv file available for further analysis.')
+    parser.add_argument('-o', '-output_format', dest = 'output_format', type = str.lower, help = 'Denotes the type of output "simple" will list all data without denoting location. "bydatacenter" will give the data structured with the datacenter city as a label. "All" ipformat will print as a CSV file.')
+    parser.add_argument('-p', '-path', dest = 'path', type = dir_path, help = r'Specifies the directory path that should be used to deposit csv files.*Required for all/csv export*')
+    parser.add_argument('-ac', '-allclouds', dest = 'all_clouds', action = 'store_true', help = 'Specifies that the data should be pulled for every ZScaler cloud instead of a single cloud.')
+    return parser.parse_args()
+@functools.lru_cache(maxsize=None)
 def clean_item(input):
-    clean_item = (str(input).split(' : '))[1]
+    clean_item = input[input.index(' : ') + 3:]
     return clean_item
+def filter_and_flatten(data, clouds, regions, datacenters, ipformat):
+    want_range = ipformat in ('range', 'all')
+    want_wildcard = ipformat in ('wildcard', 'all')
+    blocks = FlatBlocks()
+    for cloud in clouds:
+        for region, cities in data[cloud].items():
+            clean_region = clean_item(region)
+            if regions is not None and clean_region not in regions:
+                continue
+            for city, city_blocks in cities.items():
+                clean_city = clean_item(city)
+                if datacenters is not None and clean_city not in datacenters:
+                    continue
+                start = len(blocks.cidrs)
+                for block in city_blocks:
+                    try:
+                        cidr, vpn, gre, hostname, latitude, longitude = block_fields(block)
+                    except KeyError:
+                        cidr, vpn, gre, hostname, latitude, longitude = block_fields({**block_template, **block})
+                    first, last, wildcard = None, None, None
+                    if cidr != '':
+                        if want_range:
+                            first, last = usable_range(cidr)
+                        if want_wildcard:
+                            wildcard = cidr_wildcards(cidr)
+                    blocks.clouds.append(cloud)
+                    blocks.regions.append(clean_region)
+                    blocks.cities.append(clean_city)
+                    blocks.cidrs.append(cidr)
+                    blocks.vpns.append(vpn)
+                    blocks.gres.append(gre)
+                    blocks.hostnames.append(hostname)
+                    blocks.latitudes.append(latitude)
+                    blocks.longitudes.append(longitude)
+                    blocks.first_ips.append(first)
+                    blocks.last_ips.append(last)
+                    blocks.wildcards.append(wildcard)
+                blocks.datacenters.append((cloud, clean_region, clean_city, start, len(blocks.cidrs)))
+    return blocks
+def wildcard_values(blocks, start, stop):
+    values = set()
+    for wildcard in blocks.wildcards[start:stop]:
+        if wildcard is not None:
+            values.update(wildcard)
+    return values
+def range_values(blocks, start, stop):
+    values = set()
+    for frst_usable, lst_usable in zip(blocks.first_ips[start:stop], blocks.last_ips[start:stop]):
+        if frst_usable is not None:
+            values.add(ip_range(frst_usable, lst_usable))
+    return values
+def cidr_values(blocks, start, stop):
+    return set(blocks.cidrs[start:stop])
+def split_values(values):
+    if values is None:
+        return None
+    if isinstance(values, str):
+        values = values.split(',')
+    split_values = frozenset(value.strip() for value in values if value.strip())
+    if len(split_values) == 0:
+        return None
+    return split_values
+def find_config():
+    if tomllib is not None and os.path.exists('config.toml'):
+        return 'config.toml'
+    if os.path.exists('config.ini'):
+        return 'config.ini'
+    return None
+def read_config(filename):
+    if filename.endswith('.toml'):
+        with open(filename, 'rb') as config_file:
+            return tomllib.load(config_file)
+    config = configparser.ConfigParser()
+    config.read(filename)
+    return config
 def dir_path(string):
     if os.path.isdir(string):
         return string
     else:
         raise NotADirectoryError(string)
 
-# Command Line Options
-parser = argparse.ArgumentParser(
-    prog = "ZScaler Datacenter Config Extract Tool",
-    description = "This script pulls the configuration for the specified ZScaler datacenters. Configuration can be done in the command-line or provided by a config file named 'config.ini'.",
-    epilog = "Although there are many safeguards to stop from the use of bad configs or errors not all situations can be caught. If no output is provided check the configuration and verify its accuracy."
-)
-parser.add_argument('-nocfg', '-noconfig', dest = 'no_config', action = 'store_true', help = 'Specifies if the present config file should be ignored if one is present.')
-parser.add_argument('-c', '-cloud', dest = 'cloud', type = str, help = 'Specifies ZScaler cloud that the data will be pulled for ex. "zscaler.net"')
-parser.add_argument('-r', '-regions', dest = 'regions', type = str, help = 'Specifies ZScaler regions, for the specified cloud, that will be used for the data pull. for ex."Americas,EMEA" ')
-parser.add_argument('-d', '-datacenters', dest = 'datacenters', type = str, help = 'Specifies ZScaler datacenters for the specified cloud, that will be used for the data pull. ex. "Atlanta II,Atlanta III, Boston I"')
-parser.add_argument('-i', '-ipformat', dest = 'ipformat', type = str, help = 'Specifies the type of information pulled ex. "range", "cidr", "wildcard" or "all". As a note "all" will print all information into a csv file available for further analysis.')
-parser.add_argument('-o', '-output_format', dest = 'output_format', type = str, help = 'Denotes the type of output "simple" will list all data without denoting location. "bydatacenter" will give the data structured with the datacenter city as a label. "All" ipformat will print as a CSV file.')
-parser.add_argument('-p', '-path', dest = 'path', type = dir_path, help = r'Specifies the directory path that should be used to deposit csv files.*Required for all/csv export*')
-args = parser.parse_args()
+# Per-datacenter value extraction for each printable ipformat
+extractors = {'wildcard': wildcard_values, 'range': range_values, 'cidr': cidr_values}
+
+# Command Line Options, every argument default comes from the parser in parse_arguments
+config_filename = find_config()
+args = parse_arguments()
 
 # Variable Requirment Initialization
-if os.path.exists('config.ini') and args.no_config == False:
-    config = configparser.ConfigParser()
-    config.read('config.ini')
+if config_filename is not None and args.no_config == False:
+    config = read_config(config_filename)
     cloud = config['Default']['Cloud']
-    regions = config['Default']['Regions'].split(',')
-    datacenters = config['Default']['Datacenters'].split(',')
-    ipformat = config['Parameters']['IPType']
-    output_format = config['Parameters']['Format']
-    path = config['Parameters']['Path']
-elif args.cloud is None: 
+    regions = split_values(config['Default']['Regions'])
+    datacenters = split_values(config['Default']['Datacenters'])
+    ipformat = config['Parameters']['IPType'].lower()
+    output_format = config['Parameters']['Format'].lower()
+    path = config['Parameters'].get('Path')
+elif args.cloud is None and args.all_clouds == False: 
     exit(print('Config Error: ZScaler Cloud not specified'))
-elif all([args.cloud]) and args.ipformat == 'all' or args.ipformat == 'All' :
+elif all([args.cloud or args.all_clouds]) and args.ipformat == 'all':
     cloud = args.cloud
-    regions = args.regions
-    datacenters = args.datacenters
+    regions = split_values(args.regions)
+    datacenters = split_values(args.datacenters)
     ipformat = args.ipformat
-    output_format = 'All'
+    output_format = 'all'
     path = args.path
-elif all([args.cloud, args.ipformat, args.output_format]):
+elif all([args.cloud or args.all_clouds, args.ipformat, args.output_format]):
     cloud = args.cloud
-    regions = args.regions
-    datacenters = args.datacenters
+    regions = split_values(args.regions)
+    datacenters = split_values(args.datacenters)
     ipformat = args.ipformat
     output_format = args.output_format
 else:
     exit(print('Config Error: Incomplete Command-Line arguments or incomplete config file. ** IPFormat or Output Format not defined **- verify config.ini or add parameters run --help for more info'))
 
 # Parameter Validation:
-if ipformat == 'all' or ipformat == 'All':
-    if output_format != 'all' and output_format != 'All':
+if args.all_clouds == False and cloud not in zscaler_clouds:
+    exit(print('Config Error: Unknown ZScaler cloud "' + str(cloud) + '". Supported clouds are: ' + ', '.join(zscaler_clouds)))
+if ipformat == 'all':
+    if output_format != 'all':
         exit(print('Config Error: "All" data format only supports CSV export. Define the directory path or file will be created in directory script is run from.'))
 
-# Data pull for respective cloud from config.zscaler.com
-match cloud: 
-    case "zscaler.net": 
-        data = json.loads((requests.get('https://config.zscaler.com/api/zscaler.net/cenr/json')).text)
-    case "zscalerone.net":
-        data = json.loads((requests.get('https://config.zscaler.com/api/zscalerone.net/cenr/json')).text)
-    case "zscalertwo.net": 
-        data = json.loads((requests.get('https://config.zscaler.com/api/zscalertwo.net/cenr/json')).text)
-    case 'zscalerthree.net':
-        data = json.loads((requests.get('https://config.zscaler.com/api/zscalerthree.net/cenr/json')).text)
-    case "zscloud.net": 
-        data = json.loads((requests.get('https://config.zscaler.com/api/zscloud.net/cenr/json')).text)
-    case "zscalerbeta.net":
-        data = json.loads((requests.get('https://config.zscaler.com/api/zscalerbeta.net/cenr/json')).text)
-    case "zscalergov.net": 
-        data = json.loads((requests.get('https://config.zscaler.com/api/zscalergov.net/cenr/json')).text)
-    case "zscalerten.net":
-        data = json.loads((requests.get('https://config.zscaler.com/api/zscalerten.net/cenr/json')).text)
-
-# Removal of regions and datacenters that are not defined. No defenition returns all 
-if any([args.regions, args.datacenters]):
-    remove_region = []
-    for region in data[cloud]:
-        remove_datacenter = []
-        if args.regions is not None:
-            clean_rg = clean_item(region)
-            if clean_rg not in regions:
-                remove_region.append(region)
-        if args.datacenters is not None:
-            for datacenter in data[cloud][region]:
-                clean_dc = clean_item(datacenter)
-                if clean_dc not in datacenters:
-                    remove_datacenter.append(datacenter)
-        for datacenter in remove_datacenter:
-            del data[cloud][region][datacenter]
-    for region in remove_region:
-        del data[cloud][region]
+# Data pull for the requested clouds from config.zscaler.com, run concurrently when pulling several
+if args.all_clouds:
+    clouds = zscaler_clouds
+else:
+    clouds = [cloud]
+data = {}
+with ThreadPoolExecutor(max_workers = len(clouds)) as executor:
+    futures = [(cloud, executor.submit(fetch_cloud, cloud)) for cloud in clouds]
+    for cloud, future in futures:
+        # With -allclouds a cloud that cannot be pulled is reported and skipped so the others are still printed
+        if args.all_clouds and future.exception() is not None:
+            print('Pull Error: Could not pull "' + cloud + '", it is left out of the output. ' + str(future.exception()), file = sys.stderr)
+            continue
+        data.update(future.result())
+clouds = [cloud for cloud in clouds if cloud in data]
+if len(clouds) == 0:
+    exit(print('Pull Error: No ZScaler cloud could be pulled from config.zscaler.com'))
 
-# Sanitize/manipulate data
-for region in data[cloud]:
-    for city in data[cloud][region]:
-        clean_city = clean_item(city)
-        location = data[cloud][region][city]
-        cidr_range = [block.get('range') for block in location] 
-        x = 0
-        for cidr in cidr_range:
-            if cidr != '':
-                check_network = ipaddress.ip_network(cidr)
-                first, last = check_network[1], check_network[-2]
-                location[x]['first usable'] = str(first)
-                location[x]['last usable'] = str(last)
-                if first.version == 4:
-                    wildcard = []
-                    location[x]['wildcard'] = wildcard
-                    first_split = str(first).split('.')
-                    last_split = str(last).split('.')
-                    wildcard.append(first_split[0] + '.' + first_split[1] + '.' + first_split[2]+'.*')
-                    diff = (int(last_split[2]) - int(first_split[2]))
-                    while  diff >= 0 :
-                        new_wild = (first_split[0] + '.' + first_split[1] + '.' + str((int(first_split[2]) + diff)) +'.*')
-                        diff = diff - 1
-                        if new_wild in wildcard or new_wild is None:
-                            continue
-                        else: 
-                            wildcard.append(new_wild)  
-                wildcard.sort()
-            x = x + 1
+# Filter out regions and datacenters that are not defined and flatten the rest in a single pass, only computing what the ipformat prints. No defenition returns all
+blocks = filter_and_flatten(data, clouds, regions, datacenters, ipformat)
 
 # All information to CSV
-if (ipformat == 'all' or ipformat == 'All'):
+if ipformat == 'all':
     if args.path is not None:
         dir_path(args.path) 
         filename = args.path + datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + '.csv'
     else:
         filename = datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + '.csv'
     fieldnames =  ['ZScaler Cloud', 'Region', 'City', 'CIDR', 'VPN', 'GRE', 'Hostname', 'Latitude', 'Longitude', 'First IP', 'Last IP', 'Wildcard']
-    with open(filename, mode ='w', newline='') as csvfile:
-        csvwriter = csv.writer(csvfile, quotechar = "'")
+    with io.StringIO(newline='') as csvbuffer:
+        csvwriter = csv.writer(csvbuffer, quotechar = "'")
         csvwriter.writerow(fieldnames)
-        for region in data[cloud]:
-            for datacenter in data[cloud][region]:
-                w = 0
-                for item in data[cloud][region][datacenter]:
-                    r = data[cloud][region][datacenter][w]
-                    t = r.get('wildcard')
-                    if t is not None: 
-                        seperator = '-'
-                        wildcard_all = seperator.join(r.get('wildcard'))
-                    new_row = [str(cloud), str(clean_item(region)), str(clean_item(datacenter)), str(r.get('range')), str(r.get('vpn')), str(r.get('gre')), str(r.get('hostname')), str(r.get('latitude')), str(r.get('longitude')), str(r.get('first usable')), str(r.get('last usable')), str(wildcard_all)]
-                    w = w + 1
-                    csvwriter.writerow(new_row)
+        csvwriter.writerows(csv_rows(blocks))
+        with open(filename, mode ='w', newline='') as csvfile:
+            csvfile.write(csvbuffer.getvalue())
     print('CSV file written to: '+ filename)
 # Creating simple output
-elif output_format == 'simple' or output_format == 'Simple':
-    if ipformat == 'wildcard' or ipformat == 'Wildcard':  
-        simple_wildcard = []
-        for region in data[cloud]:
-            for datacenter in data[cloud][region]:
-                possible_items = [part.get(ipformat) for part in data[cloud][region][datacenter]] 
-                w = 0
-                for list in possible_items:
-                    if list is not None:
-                        frst_usable = data[cloud][region][datacenter][w].get('first usable')
-                        if ipaddress.ip_address(frst_usable).version == 4:
-                            for wildcard_ip in list:
-                                if wildcard_ip not in simple_wildcard:
-                                    simple_wildcard.append(wildcard_ip)
-                    w = w + 1
-        print_values(simple_wildcard)
-    elif ipformat == 'range' or ipformat == 'Range':  
-        ranges = []
-        for region in data[cloud]:
-            for datacenter in data[cloud][region]:
-                w = 0
-                while w < len(data[cloud][region][datacenter]):
-                    rnge = ip_range(data[cloud][region][datacenter][w])
-                    if rnge not in ranges:
-                        ranges.append(rnge)
-                    w = w + 1
-        print_values(ranges)   
-    elif ipformat == 'cidr' or ipformat == 'CIDR':
-        cidr_list = []
-        for region in data[cloud]:
-            for datacenter in data[cloud][region]:
-                w = 0
-                while w < len(data[cloud][region][datacenter]):
-                    cidr = data[cloud][region][datacenter][w].get('range')
-                    if cidr not in cidr_list:
-                        cidr_list.append(cidr)
-                    w = w + 1
-        print_values(cidr_list)
+elif output_format == 'simple' and ipformat in extractors:
+    extract = extractors[ipformat]
+    sorted_datacenters = []
+    for cloud, region, datacenter, start, stop in blocks.datacenters:
+        sorted_datacenters.append(sorted(extract(blocks, start, stop)))
+    print_values(merge_unique(sorted_datacenters))
 
 # Output by Datacenter
-elif output_format == 'bydatacenter' or output_format == 'ByDatacenter':
-    if ipformat == 'wildcard' or ipformat == 'Wildcard':  
-        for region in data[cloud]:
-            if len(data[cloud][region]) != 0:
-                print(clean_item(region))
-            for datacenter in data[cloud][region]:
-                print(clean_item(datacenter))
-                simple_wildcard = []
-                possible_items = [part.get(ipformat) for part in data[cloud][region][datacenter]] 
-                w = 0
-                for list in possible_items:
-                    if list is not None:
-                        frst_usable = data[cloud][region][datacenter][w].get('first usable')
-                        if ipaddress.ip_address(frst_usable).version == 4:
-                            for wildcard_ip in list:
-                                if wildcard_ip not in simple_wildcard:
-                                    simple_wildcard.append(wildcard_ip)
-                    w = w + 1
-                print_values(simple_wildcard)
-    elif ipformat == 'range' or ipformat == 'Range': 
-        for region in data[cloud]:
-            if len(data[cloud][region]) != 0:
-                print(clean_item(region))
-            for datacenter in data[cloud][region]:
-                print(clean_item(datacenter))
-                ranges = []
-                w = 0
-                while w < len(data[cloud][region][datacenter]):
-                    rnge = ip_range(data[cloud][region][datacenter][w])
-                    if rnge not in ranges:
-                        ranges.append(rnge)
-                    w = w + 1
-                print_values(ranges)   
-    elif ipformat == 'cidr' or ipformat == 'CIDR':
-        for region in data[cloud]:
-            if len(data[cloud][region]) != 0:
-                print(clean_item(region))
-            for datacenter in data[cloud][region]:
-                print(clean_item(datacenter))
-                cidr_list = []
-                w = 0
-                while w < len(data[cloud][region][datacenter]):
-                    cidr = data[cloud][region][datacenter][w].get('range')
-                    if cidr not in cidr_list:
-                        cidr_list.append(cidr)
-                    w = w + 1
-                print_values(cidr_list)
+elif output_format == 'bydatacenter' and ipformat in extractors:
+    extract = extractors[ipformat]
+    lines = []
+    current_cloud, current_region = None, None
+    for cloud, region, datacenter, start, stop in blocks.datacenters:
+        if cloud != current_cloud and len(clouds) > 1:
+            lines.append(cloud)
+        if (cloud, region) != (current_cloud, current_region):
+            lines.append(region)
+            current_cloud, current_region = cloud, region
+        lines.append(datacenter)
+        lines.extend(sorted(extract(blocks, start, stop)))
+    print_values(lines)
 else:
     exit(print('Configuration Error: IPFormat, Output Format, or Path not specified. ** Path is only applicable if IPFormat and Output Format are "All".**  Run -h for help.'))